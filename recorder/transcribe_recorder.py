@@ -1,46 +1,146 @@
 #!/usr/bin/env python3
 import asyncio
+import collections
 import datetime
+import functools
+import heapq
+import operator
 import pathlib
+import queue
 import signal
-import subprocess
 import sys
 import threading
 import time
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 import boto3
+import numpy
+import orjson
 import uuid
 import requests
+from requests.adapters import HTTPAdapter
+from amazon_transcribe.auth import StaticCredentialResolver
 from amazon_transcribe.client import TranscribeStreamingClient
 from amazon_transcribe.handlers import TranscriptResultStreamHandler
 from amazon_transcribe.model import TranscriptEvent
 
 # ─── Logging ─────────────────────────────────────────────────────────────────
-activity_log = []
+# Hot-path log calls just enqueue a raw (time, message) pair; a single drain
+# thread batch-formats and writes them, so callers never contend on stdout.
+activity_log = collections.deque(maxlen=10000)
+_LOG_Q = queue.Queue()
+_LOG_BATCH = 64
 
 def log_activity(message: str) -> None:
-    """Log activity with timestamp"""
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    entry = f"[{timestamp}] {message}"
-    activity_log.append(entry)
-    print(entry, flush=True)
+    """Log activity with timestamp (formatted on the drain thread)"""
+    _LOG_Q.put_nowait((time.time(), message))
+
+def _drain_log_queue() -> None:
+    """Batch queued log entries into single stdout writes"""
+    last_second = None
+    stamp = None
+    while True:
+        batch = [_LOG_Q.get()]
+        while len(batch) < _LOG_BATCH:
+            try:
+                batch.append(_LOG_Q.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            lines = []
+            for ts, message in batch:
+                second = int(ts)
+                if second != last_second:
+                    stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+                    last_second = second
+                entry = f"[{stamp}] {message}"
+                activity_log.append(entry)
+                lines.append(entry)
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
+        except Exception:
+            # stdout may be gone (parent closed the pipe); keep draining so
+            # the queue can't back up and dump_log's wait still completes
+            pass
+        finally:
+            for _ in batch:
+                _LOG_Q.task_done()
+
+threading.Thread(target=_drain_log_queue, daemon=True, name="log-drain").start()
 
 def dump_log() -> None:
-    """Dump all logged activities"""
-    print("\n" + "="*50, flush=True)
-    print("ACTIVITY LOG DUMP", flush=True)
-    print("="*50, flush=True)
-    for entry in activity_log:
-        print(entry, flush=True)
-    print("="*50, flush=True)
+    """Dump all logged activities in a single stdout write"""
+    # Bounded wait for the drain thread to catch up. Reads the counter
+    # without taking the queue mutex, so this is safe even from the signal
+    # handler and can't hang shutdown if the drain thread has died.
+    deadline = time.time() + 2.0
+    while _LOG_Q.unfinished_tasks and time.time() < deadline:
+        time.sleep(0.05)
+    divider = "=" * 50
+    try:
+        sys.stdout.write("\n".join(["", divider, "ACTIVITY LOG DUMP", divider,
+                                    *activity_log, divider, ""]))
+        sys.stdout.flush()
+    except Exception:
+        pass
+
+# ─── AWS Credentials ────────────────────────────────────────────────────────
+AWS_PROFILE = 'poweruser'
+AWS_REGION = 'ap-southeast-2'
+
+@functools.lru_cache(maxsize=None)
+def _get_session(profile: str, region: str) -> boto3.Session:
+    """Cache the boto3 session so the credential provider chain only runs once"""
+    return boto3.Session(profile_name=profile, region_name=region)
+
+_cred_resolver = None
+_cred_expiry = None
+
+def _get_credential_resolver() -> StaticCredentialResolver:
+    """Return a cached StaticCredentialResolver, refreshing only near expiry"""
+    global _cred_resolver, _cred_expiry
+    if _cred_resolver is not None:
+        if _cred_expiry is None:
+            return _cred_resolver
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if (_cred_expiry - now).total_seconds() > 60:
+            return _cred_resolver
+
+    credentials = _get_session(AWS_PROFILE, AWS_REGION).get_credentials()
+    frozen = credentials.get_frozen_credentials()
+    _cred_resolver = StaticCredentialResolver(
+        access_key_id=frozen.access_key,
+        secret_access_key=frozen.secret_key,
+        session_token=frozen.token
+    )
+    _cred_expiry = getattr(credentials, '_expiry_time', None)
+    return _cred_resolver
+
+_transcribe_client = None
+_transcribe_client_resolver = None
+
+def _get_transcribe_client() -> TranscribeStreamingClient:
+    """Reuse one streaming client so signing/connection state survives restarts"""
+    global _transcribe_client, _transcribe_client_resolver
+    resolver = _get_credential_resolver()
+    if _transcribe_client is None or _transcribe_client_resolver is not resolver:
+        _transcribe_client = TranscribeStreamingClient(
+            region=AWS_REGION, credential_resolver=resolver)
+        _transcribe_client_resolver = resolver
+    return _transcribe_client
 
 # ─── Settings ────────────────────────────────────────────────────────────────
+# Debug logging is opt-in so the hot paths skip f-string formatting entirely
+_DEBUG = os.environ.get('TRANSCRIBE_DEBUG') == '1'
+
 REC_SECONDS = 15
 MIC_SOURCE = "default"
 SYS_SOURCE = "@DEFAULT_MONITOR@"
 SAMPLE_RATE = 16000
 CHUNK_SIZE = 1024 * 2  # 2KB chunks for streaming
+SEND_CHUNK = 3200  # coalesce to >=100ms of 16kHz mono S16LE per audio event
+IDLE_TIMEOUT = 30  # end a stream after this many seconds without events
 
 # Generate unique session ID for this run
 SESSION_ID = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -51,29 +151,52 @@ CALL_ID = str(uuid.uuid4())
 window_counter = 0
 CLIENT_EMAIL = "main.jac.mil@gmail.com"  # Default email - can be updated via parameter
 
+# Persistent session so the HTTPS connection to API Gateway is reused across
+# windows instead of paying a TCP+TLS handshake per request
+API_SESSION = requests.Session()
+API_SESSION.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+# Background pool for response-file writes so disk I/O never delays the next
+# window's send; pretty-printing is opt-in since indent=2 is pure-Python slow
+_IO_POOL = ThreadPoolExecutor(max_workers=2)
+_PRETTY_RESPONSES = os.environ.get('TRANSCRIBE_PRETTY_JSON') == '1'
+
+def _save_response(filename, payload):
+    """Write an API response record to disk (runs on the I/O pool)"""
+    try:
+        data = json.dumps(payload, indent=2).encode() if isinstance(payload, dict) else payload
+        with open(filename, 'wb') as f:
+            f.write(data)
+        log_activity(f"💾 Response saved to {filename}")
+    except Exception as e:
+        log_activity(f"❌ Failed to save {filename}: {e}")
+
 # ─── Transcription Storage ──────────────────────────────────────────────────
+# Per-channel deques: appends are thread-safe on their own, and the sender
+# drains via an atomic swap, so no lock is needed on the hot append path.
 transcription_buffer = {
-    'mic': [],
-    'system': []
+    'mic': collections.deque(),
+    'system': collections.deque()
 }
 
-# Add thread lock for transcription buffer synchronization
-transcription_lock = threading.Lock()
-
-# Recording readiness tracking
-recording_ready = threading.Event()
+# Recording readiness tracking (set by write_chunks, awaited by the sender -
+# both live in the recording event loop)
+recording_ready = asyncio.Event()
 streams_ready = {'mic': False, 'system': False}
 
 class TranscriptionHandler(TranscriptResultStreamHandler):
     def __init__(self, output_stream, channel_name):
         super().__init__(output_stream)
         self.channel_name = channel_name
+        self.stream_start = time.time()  # anchor for result.end_time offsets
+        self.last_event_ts = self.stream_start  # watched by the idle watchdog
         self.last_print_time = 0
         self.events_received = 0
         self.chunks_processed = 0
-    
+
     async def handle_transcript_event(self, transcript_event: TranscriptEvent):
         self.events_received += 1
+        self.last_event_ts = time.time()
         
         results = transcript_event.transcript.results
         if len(results) == 0:
@@ -82,142 +205,252 @@ class TranscriptionHandler(TranscriptResultStreamHandler):
                 log_activity(f"🔍 [{self.channel_name}]: Event #{self.events_received} - no speech detected (audio flowing)")
             return
         
-        for i, result in enumerate(results):
-            for j, alt in enumerate(result.alternatives):
-                transcript = alt.transcript
-                confidence = getattr(alt, 'confidence', None)
-                
-                if not result.is_partial and transcript.strip():
-                    timestamp = datetime.datetime.now().isoformat() + "Z"
-                    
-                    # Use thread lock to safely add to transcription buffer
-                    with transcription_lock:
-                        transcription_buffer[self.channel_name].append({
-                            'timestamp': timestamp,
-                            'text': transcript
-                        })
-                        buffer_size = len(transcription_buffer[self.channel_name])
-                    
-                    conf_str = f" (confidence: {confidence:.2f})" if confidence else ""
-                    log_activity(f"🎙️ [{self.channel_name.upper()}] FINAL: {transcript}{conf_str}")
-                    log_activity(f"📝 [{self.channel_name.upper()}] BUFFER: Added transcript (buffer size: {buffer_size})")
-                elif result.is_partial and transcript.strip():
-                    log_activity(f"🔄 [{self.channel_name.upper()}] PARTIAL: {transcript}")
+        for result in results:
+            # Events already carry their offset into the stream, so derive the
+            # wall-clock timestamp once per result instead of calling now()
+            # for every alternative
+            timestamp = None
+            if not result.is_partial:
+                end_time = self.stream_start + (result.end_time or 0.0)
+                timestamp = datetime.datetime.fromtimestamp(
+                    end_time, datetime.timezone.utc).isoformat().replace('+00:00', 'Z')
+
+            # Streaming alternatives are confidence-ordered and length 1
+            # unless show_alternatives is enabled, so only [0] matters
+            if not result.alternatives:
+                continue
+            alt = result.alternatives[0]
+            transcript = alt.transcript
+            # Plain dict lookup - confidence isn't a declared field on
+            # streaming alternatives, and getattr-with-default is slow
+            confidence = alt.__dict__.get('confidence')
+
+            if not result.is_partial and transcript.strip():
+                # Lock-free: deque.append is atomic under the GIL
+                transcription_buffer[self.channel_name].append({
+                    'timestamp': timestamp,
+                    'text': transcript
+                })
+                buffer_size = len(transcription_buffer[self.channel_name])
+
+                conf_str = f" (confidence: {confidence:.2f})" if confidence else ""
+                log_activity(f"🎙️ [{self.channel_name.upper()}] FINAL: {transcript}{conf_str}")
+                log_activity(f"📝 [{self.channel_name.upper()}] BUFFER: Added transcript (buffer size: {buffer_size})")
+            elif result.is_partial and transcript.strip():
+                log_activity(f"🔄 [{self.channel_name.upper()}] PARTIAL: {transcript}")
 
 # ─── Audio Stream Generator ─────────────────────────────────────────────────
-async def mic_stream():
-    """Generate audio stream from microphone"""
-    cmd = [
-        "ffmpeg",
-        "-f", "pulse", "-i", MIC_SOURCE,
-        "-ar", str(SAMPLE_RATE),
-        "-ac", "1",  # mono
-        "-acodec", "pcm_s16le",
-        "-f", "s16le",
-        "-"
-    ]
-    
-    log_activity(f"🔍 DEBUG [MIC]: Starting ffmpeg with command: {' '.join(cmd)}")
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    
-    chunk_count = 0
+# Single ffmpeg process captures mic + system audio as an interleaved stereo
+# stream; a demux task splits it into per-channel mono chunks.
+_capture = {'proc': None, 'task': None, 'queues': None, 'consumers': 0,
+            'stderr_task': None, 'stderr_lines': None}
+_capture_lock = asyncio.Lock()
+
+# Ring of pre-allocated chunk slots per channel: the demux writes into the
+# next slot and hands out a memoryview, so the hot path allocates nothing.
+# Deeper than the 64-slot queues so a slot can't be overwritten in flight.
+POOL_SLOTS = 72
+
+async def _start_capture():
+    """Launch the shared 2-channel ffmpeg capture (no-op if already running)"""
+    async with _capture_lock:
+        if _capture['proc'] is not None and _capture['proc'].returncode is None:
+            # Count the consumer only once the capture is confirmed up, so a
+            # failed spawn can't leave the refcount permanently inflated
+            _capture['consumers'] += 1
+            return
+
+        cmd = [
+            "ffmpeg",
+            "-fflags", "+nobuffer", "-flags", "low_delay", "-max_delay", "0",
+            "-f", "pulse", "-i", MIC_SOURCE,
+            "-f", "pulse", "-i", SYS_SOURCE,
+            "-filter_complex", "[0:a][1:a]amerge=inputs=2",
+            "-ar", str(SAMPLE_RATE),
+            "-ac", "2",  # mic on left, system on right
+            "-acodec", "pcm_s16le",
+            "-f", "s16le",
+            "-"
+        ]
+
+        if _DEBUG:
+            log_activity(f"🔍 DEBUG [CAPTURE]: Starting ffmpeg with command: {' '.join(cmd)}")
+        # stderr goes to DEVNULL in steady state - an unread pipe would fill
+        # up over a long session and stall ffmpeg itself. With debug on, a
+        # drain task keeps the pipe empty and remembers the last few lines.
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE if _DEBUG else asyncio.subprocess.DEVNULL)
+        queues = {'mic': asyncio.Queue(maxsize=64), 'system': asyncio.Queue(maxsize=64)}
+        _capture['proc'] = proc
+        _capture['queues'] = queues
+        _capture['task'] = asyncio.create_task(_demux_capture(proc, queues))
+        if _DEBUG:
+            _capture['stderr_lines'] = collections.deque(maxlen=50)
+            _capture['stderr_task'] = asyncio.create_task(
+                _drain_stderr(proc.stderr, _capture['stderr_lines']))
+        _capture['consumers'] += 1
+
+async def _drain_stderr(stderr, lines):
+    """Keep ffmpeg's stderr pipe empty, retaining only the most recent lines"""
+    while True:
+        line = await stderr.readline()
+        if not line:
+            break
+        lines.append(line.decode('utf-8', errors='ignore').rstrip())
+
+def _offer_chunk(chunk_queue, item):
+    """Non-blocking put that drops the oldest entry when the queue is full
+
+    One channel's consumer dying (e.g. its stream never started) must not
+    block the demux and starve the healthy channel; stale audio is worthless.
+    """
+    try:
+        chunk_queue.put_nowait(item)
+    except asyncio.QueueFull:
+        try:
+            chunk_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        try:
+            chunk_queue.put_nowait(item)
+        except asyncio.QueueFull:
+            pass
+
+async def _demux_capture(proc, queues):
+    """Read interleaved stereo frames and fan out mono chunks per channel"""
+    frame_bytes = CHUNK_SIZE * 2  # one stereo read yields CHUNK_SIZE per channel
+    pools = {
+        'mic': [bytearray(CHUNK_SIZE) for _ in range(POOL_SLOTS)],
+        'system': [bytearray(CHUNK_SIZE) for _ in range(POOL_SLOTS)]
+    }
+    slot = 0
     try:
         while True:
-            chunk = proc.stdout.read(CHUNK_SIZE)
-            if not chunk:
-                log_activity(f"🔍 DEBUG [MIC]: No more chunks, breaking (total chunks: {chunk_count})")
+            try:
+                buf = await proc.stdout.readexactly(frame_bytes)
+            except asyncio.IncompleteReadError as eof:
+                buf = eof.partial
+            if not buf:
+                break
+            # Drop any trailing partial frame so the reshape stays aligned
+            frames = numpy.frombuffer(buf[:len(buf) // 4 * 4], '<i2').reshape(-1, 2)
+            samples = frames.shape[0]
+            for channel, column in (('mic', 0), ('system', 1)):
+                dest = pools[channel][slot % POOL_SLOTS]
+                numpy.frombuffer(dest, '<i2')[:samples] = frames[:, column]
+                _offer_chunk(queues[channel], memoryview(dest)[:samples * 2])
+            slot += 1
+            if len(buf) < frame_bytes:
                 break
-            chunk_count += 1
-            if chunk_count % 500 == 0:  # Log every 500 chunks
-                log_activity(f"🔍 [MIC]: Sent chunk #{chunk_count} ({len(chunk)} bytes)")
-            yield chunk
     except Exception as e:
-        log_activity(f"❌ DEBUG [MIC]: Stream error: {e}")
+        log_activity(f"❌ DEBUG [CAPTURE]: Demux error: {e}")
     finally:
+        # Must not await here: a blocking put on a full queue would hang this
+        # finally forever if the task is cancelled, leaking the task and both
+        # pools. _offer_chunk makes room for the sentinel if needed.
+        _offer_chunk(queues['mic'], None)
+        _offer_chunk(queues['system'], None)
+
+async def _stop_capture():
+    """Release one consumer; tear down ffmpeg once both channels are done"""
+    async with _capture_lock:
+        _capture['consumers'] -= 1
+        if _capture['consumers'] > 0:
+            return
+        proc = _capture['proc']
+        if proc is None:
+            return
+        _capture['proc'] = None
         try:
-            if proc.poll() is None:
+            if proc.returncode is None:
                 proc.terminate()
-            if proc.stderr and not proc.stderr.closed:
-                stderr = proc.stderr.read().decode('utf-8', errors='ignore')
-                if stderr:
-                    log_activity(f"🔍 DEBUG [MIC]: FFmpeg stderr: {stderr}")
-            proc.wait()
+            if _capture['task'] is not None:
+                _capture['task'].cancel()
+                _capture['task'] = None
+            if _capture['stderr_task'] is not None:
+                _capture['stderr_task'].cancel()
+                _capture['stderr_task'] = None
+            if _DEBUG and _capture['stderr_lines']:
+                tail = '\n'.join(_capture['stderr_lines'])
+                log_activity(f"🔍 DEBUG [CAPTURE]: FFmpeg stderr (last {len(_capture['stderr_lines'])} lines): {tail}")
+                _capture['stderr_lines'] = None
+            await proc.wait()
         except Exception as cleanup_error:
-            log_activity(f"🔍 DEBUG [MIC]: Cleanup error: {cleanup_error}")
-        log_activity(f"🔍 DEBUG [MIC]: Stream ended, total chunks: {chunk_count}")
+            if _DEBUG:
+                log_activity(f"🔍 DEBUG [CAPTURE]: Cleanup error: {cleanup_error}")
 
-async def system_stream():
-    """Generate audio stream from system audio"""
-    cmd = [
-        "ffmpeg",
-        "-f", "pulse", "-i", SYS_SOURCE,
-        "-ar", str(SAMPLE_RATE),
-        "-ac", "1",  # mono
-        "-acodec", "pcm_s16le",
-        "-f", "s16le",
-        "-"
-    ]
-    
-    log_activity(f"🔍 DEBUG [SYSTEM]: Starting ffmpeg with command: {' '.join(cmd)}")
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    
+async def _channel_stream(channel, label):
+    """Generate mono audio chunks for one channel of the shared capture"""
+    await _start_capture()
+    chunk_queue = _capture['queues'][channel]
     chunk_count = 0
     try:
         while True:
-            chunk = proc.stdout.read(CHUNK_SIZE)
-            if not chunk:
-                log_activity(f"🔍 DEBUG [SYSTEM]: No more chunks, breaking (total chunks: {chunk_count})")
+            chunk = await chunk_queue.get()
+            if chunk is None:
+                if _DEBUG:
+                    log_activity(f"🔍 DEBUG [{label}]: No more chunks, breaking (total chunks: {chunk_count})")
                 break
             chunk_count += 1
-            if chunk_count % 500 == 0:  # Log every 500 chunks
-                log_activity(f"🔍 [SYSTEM]: Sent chunk #{chunk_count} ({len(chunk)} bytes)")
+            if _DEBUG and chunk_count % 500 == 0:  # Log every 500 chunks
+                log_activity(f"🔍 [{label}]: Sent chunk #{chunk_count} ({len(chunk)} bytes)")
             yield chunk
     except Exception as e:
-        log_activity(f"❌ DEBUG [SYSTEM]: Stream error: {e}")
+        log_activity(f"❌ DEBUG [{label}]: Stream error: {e}")
     finally:
-        try:
-            if proc.poll() is None:
-                proc.terminate()
-            if proc.stderr and not proc.stderr.closed:
-                stderr = proc.stderr.read().decode('utf-8', errors='ignore')
-                if stderr:
-                    log_activity(f"🔍 DEBUG [SYSTEM]: FFmpeg stderr: {stderr}")
-            proc.wait()
-        except Exception as cleanup_error:
-            log_activity(f"🔍 DEBUG [SYSTEM]: Cleanup error: {cleanup_error}")
-        log_activity(f"🔍 DEBUG [SYSTEM]: Stream ended, total chunks: {chunk_count}")
+        await _stop_capture()
+        if _DEBUG:
+            log_activity(f"🔍 DEBUG [{label}]: Stream ended, total chunks: {chunk_count}")
+
+async def mic_stream():
+    """Generate audio stream from microphone"""
+    async for chunk in _channel_stream('mic', 'MIC'):
+        yield chunk
+
+async def system_stream():
+    """Generate audio stream from system audio"""
+    async for chunk in _channel_stream('system', 'SYSTEM'):
+        yield chunk
 
 # ─── Transcription Functions ────────────────────────────────────────────────
+async def _idle_watchdog(handler, stream, channel_name, idle=IDLE_TIMEOUT):
+    """End the stream once no transcript events arrive for `idle` seconds
+
+    Without this, a dead stream sits in the 5-minute gather timeout holding
+    a Transcribe connection (and concurrent-stream quota) the whole time.
+    """
+    while True:
+        await asyncio.sleep(5)
+        if time.time() - handler.last_event_ts > idle:
+            log_activity(f"⏱️ [{channel_name}]: No events for {idle}s - ending stream")
+            try:
+                await stream.input_stream.end_stream()
+            except Exception as e:
+                if _DEBUG:
+                    log_activity(f"🔍 DEBUG [{channel_name}]: Watchdog end_stream error: {e}")
+            return
+
 async def start_transcription(stream_generator, channel_name):
     """Start transcription for a given audio stream"""
-    log_activity(f"🔍 DEBUG [{channel_name}]: Initializing transcription client for region ap-southeast-2")
+    if _DEBUG:
+        log_activity(f"🔍 DEBUG [{channel_name}]: Initializing transcription client for region ap-southeast-2")
     
     try:
-        # Get credentials from the poweruser AWS profile
-        log_activity(f"🔍 DEBUG [{channel_name}]: Creating boto3 session...")
-        session = boto3.Session(profile_name='poweruser', region_name='ap-southeast-2')
-        log_activity(f"🔍 DEBUG [{channel_name}]: Getting credentials...")
-        credentials = session.get_credentials()
+        # Shared client built from the cached poweruser profile credentials
+        if _DEBUG:
+            log_activity(f"🔍 DEBUG [{channel_name}]: Getting shared TranscribeStreamingClient...")
+        client = _get_transcribe_client()
         
-        # Set environment variables for amazon-transcribe client
-        log_activity(f"🔍 DEBUG [{channel_name}]: Setting environment variables...")
-        os.environ['AWS_ACCESS_KEY_ID'] = credentials.access_key
-        os.environ['AWS_SECRET_ACCESS_KEY'] = credentials.secret_key
-        if credentials.token:
-            os.environ['AWS_SESSION_TOKEN'] = credentials.token
-        os.environ['AWS_DEFAULT_REGION'] = 'ap-southeast-2'
-        
-        log_activity(f"🔍 DEBUG [{channel_name}]: Set AWS credentials from profile 'poweruser'")
-        log_activity(f"🔍 DEBUG [{channel_name}]: Creating TranscribeStreamingClient...")
-        client = TranscribeStreamingClient(region="ap-southeast-2")
-        
-        log_activity(f"🔍 DEBUG [{channel_name}]: Starting stream transcription...")
+        if _DEBUG:
+            log_activity(f"🔍 DEBUG [{channel_name}]: Starting stream transcription...")
         stream = await client.start_stream_transcription(
             language_code="en-US",
             media_sample_rate_hz=SAMPLE_RATE,
             media_encoding="pcm"
         )
-        log_activity(f"🔍 DEBUG [{channel_name}]: Stream transcription started successfully")
+        if _DEBUG:
+            log_activity(f"🔍 DEBUG [{channel_name}]: Stream transcription started successfully")
         
         # Create handler after stream is created
         handler = TranscriptionHandler(stream.output_stream, channel_name)
@@ -225,11 +458,20 @@ async def start_transcription(stream_generator, channel_name):
         chunks_sent = 0
         async def write_chunks():
             nonlocal chunks_sent
-            log_activity(f"🔍 DEBUG [{channel_name}]: Starting to write audio chunks...")
+            if _DEBUG:
+                log_activity(f"🔍 DEBUG [{channel_name}]: Starting to write audio chunks...")
             try:
-                log_activity(f"🔍 DEBUG [{channel_name}]: About to call stream_generator()")
+                if _DEBUG:
+                    log_activity(f"🔍 DEBUG [{channel_name}]: About to call stream_generator()")
                 stream_gen = stream_generator()
-                log_activity(f"🔍 DEBUG [{channel_name}]: Stream generator created: {type(stream_gen)}")
+                if _DEBUG:
+                    log_activity(f"🔍 DEBUG [{channel_name}]: Stream generator created: {type(stream_gen)}")
+                # Coalesce the 64ms capture chunks into >=100ms audio events:
+                # AWS recommends 100-200ms packets, and fewer events means
+                # less HTTP/2 and event-stream framing per byte sent
+                send_buf = bytearray(SEND_CHUNK * 2)
+                send_view = memoryview(send_buf)
+                offset = 0
                 # Emit recording_active event when audio processing starts
                 first_chunk = True
                 async for chunk in stream_gen:
@@ -244,21 +486,33 @@ async def start_transcription(stream_generator, channel_name):
                                 recording_ready.set()
                                 log_activity("🚀 Both audio streams ready - Starting API timer!")
                         first_chunk = False
-                    if chunks_sent % 500 == 0:  # Log every 500 chunks
+                    if _DEBUG and chunks_sent % 500 == 0:  # Log every 500 chunks
                         log_activity(f"🔍 [{channel_name}]: Sent {chunks_sent} chunks to AWS")
-                    await stream.input_stream.send_audio_event(audio_chunk=chunk)
-                log_activity(f"🔍 DEBUG [{channel_name}]: Ending stream after {chunks_sent} chunks")
+                    n = len(chunk)
+                    send_view[offset:offset + n] = chunk
+                    offset += n
+                    if offset >= SEND_CHUNK:
+                        await stream.input_stream.send_audio_event(audio_chunk=bytes(send_view[:offset]))
+                        offset = 0
+                if offset:
+                    # Flush whatever is left before ending the stream
+                    await stream.input_stream.send_audio_event(audio_chunk=bytes(send_view[:offset]))
+                if _DEBUG:
+                    log_activity(f"🔍 DEBUG [{channel_name}]: Ending stream after {chunks_sent} chunks")
                 await stream.input_stream.end_stream()
             except Exception as e:
                 log_activity(f"❌ DEBUG [{channel_name}]: Error in write_chunks: {e}")
                 import traceback
                 log_activity(f"❌ DEBUG [{channel_name}]: write_chunks traceback: {traceback.format_exc()}")
         
-        log_activity(f"🔍 DEBUG [{channel_name}]: Creating async tasks...")
+        if _DEBUG:
+            log_activity(f"🔍 DEBUG [{channel_name}]: Creating async tasks...")
         handler_task = asyncio.create_task(handler.handle_events())
         write_task = asyncio.create_task(write_chunks())
-        
-        log_activity(f"🔍 DEBUG [{channel_name}]: Starting concurrent tasks...")
+        watchdog_task = asyncio.create_task(_idle_watchdog(handler, stream, channel_name))
+
+        if _DEBUG:
+            log_activity(f"🔍 DEBUG [{channel_name}]: Starting concurrent tasks...")
         
         # Run tasks with reasonable timeout to prevent indefinite hanging
         try:
@@ -268,7 +522,8 @@ async def start_transcription(stream_generator, channel_name):
             log_activity(f"⚠️ DEBUG [{channel_name}]: Handler task done: {handler_task.done()}, Write task done: {write_task.done()}")
             # Don't treat timeout as fatal error, just log and continue
         except asyncio.CancelledError:
-            log_activity(f"🔍 DEBUG [{channel_name}]: Tasks cancelled gracefully")
+            if _DEBUG:
+                log_activity(f"🔍 DEBUG [{channel_name}]: Tasks cancelled gracefully")
         except Exception as task_error:
             log_activity(f"❌ DEBUG [{channel_name}]: Task error: {task_error}")
         finally:
@@ -277,79 +532,67 @@ async def start_transcription(stream_generator, channel_name):
                 handler_task.cancel()
             if not write_task.done():
                 write_task.cancel()
+            if not watchdog_task.done():
+                watchdog_task.cancel()
             
             # Allow some time for any final transcripts to be processed
             await asyncio.sleep(0.5)
         
-        log_activity(f"🔍 DEBUG [{channel_name}]: Transcription completed - Total events: {handler.events_received}")
+        if _DEBUG:
+            log_activity(f"🔍 DEBUG [{channel_name}]: Transcription completed - Total events: {handler.events_received}")
         
     except Exception as e:
         log_activity(f"❌ Transcription error for {channel_name}: {str(e)}")
         import traceback
-        log_activity(f"🔍 DEBUG [{channel_name}]: Full traceback: {traceback.format_exc()}")
+        if _DEBUG:
+            log_activity(f"🔍 DEBUG [{channel_name}]: Full traceback: {traceback.format_exc()}")
 
 # ─── API Request Sender ─────────────────────────────────────────────────────
-def send_api_requests_periodically():
-    """Send transcriptions to API periodically"""
+async def send_api_requests_periodically(stop_evt: asyncio.Event):
+    """Send transcriptions to API periodically (runs in the recording loop)"""
     global window_counter
-    
+
     # Wait for recording to be actually ready before starting timer
     log_activity("⏳ API sender waiting for recording streams to be ready...")
-    recording_ready.wait()
+    await recording_ready.wait()
     log_activity(f"✅ Recording ready! Starting {REC_SECONDS}-second API request timer...")
-    
-    while True:
-        time.sleep(REC_SECONDS)
-        
+
+    while not stop_evt.is_set():
+        await asyncio.sleep(REC_SECONDS)
+
         # Capture buffer state at the moment of sending (not before)
         log_activity("⏰ API timer triggered - checking for transcriptions...")
-        
-        # Use thread lock to safely read and capture transcription buffer
-        with transcription_lock:
-            # Log current buffer state
-            mic_count = len(transcription_buffer['mic'])
-            system_count = len(transcription_buffer['system'])
-            log_activity(f"📊 BUFFER STATUS: mic={mic_count}, system={system_count}")
-            
-            # Combine mic (agent) and system (customer) transcriptions
-            all_transcriptions = []
-            
-            # Add mic transcriptions as agent
-            for entry in transcription_buffer['mic']:
-                all_transcriptions.append({
-                    'speaker': 'agent',
-                    'transcript': entry['text'],
-                    'timestamp': entry['timestamp']
-                })
-            
-            # Add system transcriptions as customer
-            for entry in transcription_buffer['system']:
-                all_transcriptions.append({
-                    'speaker': 'customer', 
-                    'transcript': entry['text'],
-                    'timestamp': entry['timestamp']
-                })
-            
-            # Sort by timestamp
-            all_transcriptions.sort(key=lambda x: x['timestamp'])
-            
-            # Take recent transcriptions (last 10 or all if fewer)
-            recent_transcriptions = all_transcriptions[-10:] if len(all_transcriptions) > 10 else all_transcriptions
-            
-            # Clear buffer immediately after capturing to prevent loss
-            cleared_mic = len(transcription_buffer['mic'])
-            cleared_system = len(transcription_buffer['system'])
-            transcription_buffer['mic'] = []
-            transcription_buffer['system'] = []
-            
-            # Log what we're about to send
-            if recent_transcriptions:
-                log_activity(f"📤 SENDING {len(recent_transcriptions)} transcriptions (buffer cleared: mic={cleared_mic}, system={cleared_system}):")
-                for i, trans in enumerate(recent_transcriptions):
-                    log_activity(f"  {i+1}. [{trans['speaker']}] {trans['transcript'][:50]}...")
-            else:
-                log_activity(f"📡 No transcriptions to send (cleared empty buffer: mic={cleared_mic}, system={cleared_system})")
-        
+
+        # Atomically swap out both deques (GIL makes the swap atomic), then
+        # build/sort/serialize on the drained copies without blocking appends
+        mic_old, transcription_buffer['mic'] = transcription_buffer['mic'], collections.deque()
+        system_old, transcription_buffer['system'] = transcription_buffer['system'], collections.deque()
+
+        mic_count = len(mic_old)
+        system_count = len(system_old)
+        log_activity(f"📊 BUFFER STATUS: mic={mic_count}, system={system_count}")
+
+        # Both deques are already in arrival order, so an O(n) merge replaces
+        # the concatenate-and-sort; mic is the agent, system is the customer
+        merged = heapq.merge(
+            ({'speaker': 'agent', 'transcript': e['text'], 'timestamp': e['timestamp']}
+             for e in mic_old),
+            ({'speaker': 'customer', 'transcript': e['text'], 'timestamp': e['timestamp']}
+             for e in system_old),
+            key=operator.itemgetter('timestamp'))
+
+        # Take recent transcriptions (last 10 or all if fewer) without
+        # materializing the full merged list
+        recent_transcriptions = list(collections.deque(merged, maxlen=10))
+
+        # Log what we're about to send
+        if recent_transcriptions:
+            log_activity(f"📤 SENDING {len(recent_transcriptions)} transcriptions (buffer drained: mic={mic_count}, system={system_count}):")
+            for i, trans in enumerate(recent_transcriptions):
+                log_activity(f"  {i+1}. [{trans['speaker']}] {trans['transcript'][:50]}...")
+        else:
+            log_activity(f"📡 No transcriptions to send (drained empty buffer: mic={mic_count}, system={system_count})")
+
         if recent_transcriptions:
             window_counter += 1
             
@@ -362,7 +605,14 @@ def send_api_requests_periodically():
             
             try:
                 log_activity(f"📤 Sending API request (window {window_counter})...")
-                response = requests.post(API_ENDPOINT, json=payload, timeout=30)
+                # Serialize with orjson and post the raw bytes, skipping the
+                # stdlib json encoder inside requests. Pooled session is sync,
+                # so post from a worker thread to keep the loop free for the
+                # audio streams and handlers
+                body = orjson.dumps(payload)
+                response = await asyncio.to_thread(
+                    API_SESSION.post, API_ENDPOINT, data=body,
+                    headers={'Content-Type': 'application/json'}, timeout=30)
                 log_activity(f"📡 API Request sent (window {window_counter}): {response.status_code}")
                 
                 # Save response to JSON file
@@ -375,13 +625,17 @@ def send_api_requests_periodically():
                     "response_body": response.text
                 }
                 
+                # Serialize once; reuse for the file write and the passthrough
+                response_json = orjson.dumps(response_data)
                 filename = f"api_response_{SESSION_ID}_window_{window_counter}.json"
-                with open(filename, 'w') as f:
-                    json.dump(response_data, f, indent=2)
-                log_activity(f"💾 Response saved to {filename}")
-                
-                # Send response data to frontend via special log message
-                print(f"🔄 API_RESPONSE_DATA: {json.dumps(response_data)}", flush=True)
+                _IO_POOL.submit(_save_response, filename,
+                                response_data if _PRETTY_RESPONSES else response_json)
+
+                # Send response data to frontend via special log message,
+                # writing the bytes straight to stdout's buffer
+                sys.stdout.flush()
+                sys.stdout.buffer.write("🔄 API_RESPONSE_DATA: ".encode() + response_json + b"\n")
+                sys.stdout.buffer.flush()
                 
                 if response.status_code != 200:
                     log_activity(f"❌ API Error: {response.text}")
@@ -391,69 +645,91 @@ def send_api_requests_periodically():
         # Note: Buffer was already cleared immediately after capture to prevent race conditions
 
 # ─── Main Recording Loop ────────────────────────────────────────────────────
-async def recording_loop(running_evt: threading.Event, stop_evt: threading.Event):
+async def recording_loop(running_evt: asyncio.Event, stop_evt: asyncio.Event):
     """Main async recording loop"""
     while not stop_evt.is_set():
-        if running_evt.is_set():
-            log_activity("🎤🔊 Starting real-time transcription...")
-            
-            # Reset readiness tracking for new recording session
-            recording_ready.clear()
-            streams_ready['mic'] = False
-            streams_ready['system'] = False
-            
-            try:
-                # Start both transcription streams concurrently with timeout for initialization
-                await asyncio.wait_for(asyncio.gather(
-                    start_transcription(mic_stream, "mic"),
-                    start_transcription(system_stream, "system")
-                ), timeout=600.0)  # 10 minute timeout for initialization
-            except asyncio.TimeoutError:
-                log_activity("❌ Recording initialization timeout after 10 minutes")
-                log_activity("🔄 Will retry in next loop iteration...")
-            except Exception as e:
-                log_activity(f"❌ Recording error: {str(e)}")
-                import traceback
-                log_activity(f"❌ Full traceback: {traceback.format_exc()}")
-                
-        await asyncio.sleep(0.5)
+        # Sleep until the main thread signals start - no periodic polling
+        await running_evt.wait()
+        if stop_evt.is_set():
+            break
+
+        log_activity("🎤🔊 Starting real-time transcription...")
+
+        # Reset readiness tracking for new recording session
+        recording_ready.clear()
+        streams_ready['mic'] = False
+        streams_ready['system'] = False
+
+        session_start = time.monotonic()
+        try:
+            # Start both transcription streams concurrently with timeout for initialization
+            await asyncio.wait_for(asyncio.gather(
+                start_transcription(mic_stream, "mic"),
+                start_transcription(system_stream, "system")
+            ), timeout=600.0)  # 10 minute timeout for initialization
+        except asyncio.TimeoutError:
+            log_activity("❌ Recording initialization timeout after 10 minutes")
+            log_activity("🔄 Will retry in next loop iteration...")
+        except Exception as e:
+            log_activity(f"❌ Recording error: {str(e)}")
+            import traceback
+            log_activity(f"❌ Full traceback: {traceback.format_exc()}")
+
+        # start_transcription swallows its own errors, so a session that dies
+        # within seconds means startup is failing persistently (bad profile,
+        # missing ffmpeg); back off instead of hot-spinning the retry loop
+        if time.monotonic() - session_start < 5.0:
+            await asyncio.sleep(2.0)
 
 # ─── Main Function ──────────────────────────────────────────────────────────
 def main():
-    running = threading.Event()
     stop = threading.Event()
-    
-    # Start periodic API request sender
-    api_sender_thread = threading.Thread(target=send_api_requests_periodically, daemon=True)
-    api_sender_thread.start()
-    
-    # Start async recording loop in a separate thread
+
+    # asyncio events live in the recording loop's thread; the main thread
+    # signals them via call_soon_threadsafe so the coroutine sleeps until told
+    loop_state = {}
+    loop_ready = threading.Event()
+
+    # Start async recording loop and API sender together in a separate thread
     def run_async_loop():
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        loop.run_until_complete(recording_loop(running, stop))
-    
+        loop_state['loop'] = loop
+        loop_state['running'] = asyncio.Event()
+        loop_state['stop'] = asyncio.Event()
+        loop_ready.set()
+        loop.run_until_complete(asyncio.gather(
+            recording_loop(loop_state['running'], loop_state['stop']),
+            send_api_requests_periodically(loop_state['stop'])
+        ))
+
     recording_thread = threading.Thread(target=run_async_loop, daemon=True)
     recording_thread.start()
-    
+    loop_ready.wait()
+
+    def signal_loop(callback):
+        loop_state['loop'].call_soon_threadsafe(callback)
+
     log_activity(f"Real-time transcription recorder started (Session: {SESSION_ID})")
     log_activity(f"Call ID: {CALL_ID}")
     log_activity(f"API Endpoint: {API_ENDPOINT}")
     log_activity("Commands: s=start, p=pause, q=quit")
     print("Real-time transcription recorder ready (s=start, p=pause, q=quit)", flush=True)
-    
+
     try:
         while not stop.is_set():
             cmd = sys.stdin.readline().strip().lower()
             if cmd == "s":
-                running.set()
+                signal_loop(loop_state['running'].set)
                 log_activity("🟢 Transcription mode activated")
             elif cmd == "p":
-                running.clear()
+                signal_loop(loop_state['running'].clear)
                 log_activity("🟡 Transcription paused")
             elif cmd == "q":
                 log_activity("🔴 Quit command received")
                 stop.set()
+                signal_loop(loop_state['stop'].set)
+                signal_loop(loop_state['running'].set)  # wake the waiter so it can exit
             elif cmd:
                 print("Valid commands: s / p / q", flush=True)
     except KeyboardInterrupt:
@@ -464,7 +740,13 @@ def main():
 
 # Graceful shutdown
 def shutdown_handler(*_):
-    log_activity("🔴 Shutdown signal received")
+    # No log_activity here: the queue's mutex isn't reentrant, and the signal
+    # may land while the interrupted thread is holding it
+    try:
+        sys.stdout.write("🔴 Shutdown signal received\n")
+        sys.stdout.flush()
+    except Exception:
+        pass
     dump_log()
     sys.exit(0)
 